@@ -0,0 +1,846 @@
+"""
+Benchmarks for the Edumorph pipeline stages.
+
+Each subcommand drives the real functions in Edumorph.py and prints a small results table.
+The completion cache is disabled for benchmarks that measure LLM usage, so every run
+reaches Groq. The offline benchmark needs no network: it swaps in the canned LLM and
+silent TTS backends and a throwaway database and artifacts store.
+
+Usage:
+    python benchmark.py narration --topic Python --subtopic Loops --runs 3
+    python benchmark.py video --slides 10 --seconds 6
+    python benchmark.py parsers --fuzz 50
+    python benchmark.py offline --runs 20 --concurrency 4 --llm-latency 0.2
+    python benchmark.py tts --backend espeak --slides 10
+    python benchmark.py sanitize --runs 200
+    python benchmark.py startup --runs 5
+    python benchmark.py memory --slides 10 40 --seconds 3
+    python benchmark.py scheduler --rpm 300 --tpm 30000 --background 120 --interactive 30
+"""
+import argparse
+import collections
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Benchmarks must never write to the application's database; set before Edumorph is imported
+os.environ.setdefault('EDUMORPH_DATABASE_URI', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'edumorph-benchmark.db'))
+
+import Edumorph
+import llm_parsers
+import llm_scheduler
+import sanitize
+
+
+def llm_usage():
+    with Edumorph.llm_stats_lock:
+        return dict(Edumorph.llm_stats)
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(who).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+
+def bench_narration(args):
+    # Compares one completion per slide against a single batched JSON completion for the deck
+    Edumorph.app.config['COMPLETION_CACHE_ENABLED'] = False
+    slides = Edumorph.summarize_content("\n".join(Edumorph.create_slides(args.topic, args.subtopic)) + "\n")
+    print(f"Deck has {len(slides)} slides")
+
+    def per_slide():
+        return list(Edumorph.narration_executor.map(lambda item: Edumorph.slide_explanation(*item), enumerate(slides)))
+
+    def batched():
+        explanations = Edumorph.batched_slide_explanations(list(enumerate(slides)))
+        for idx, slide in enumerate(slides):
+            if idx not in explanations:
+                explanations[idx] = Edumorph.slide_explanation(idx, slide)
+        return [explanations[idx] for idx in range(len(slides))]
+
+    rows = []
+    for name, narrate in (('per_slide', per_slide), ('batched', batched)):
+        timings, usages = [], []
+        for _ in range(args.runs):
+            before = llm_usage()
+            start = time.perf_counter()
+            narrate()
+            timings.append(time.perf_counter() - start)
+            after = llm_usage()
+            usages.append({key: after[key] - before[key] for key in after})
+        rows.append([
+            name,
+            statistics.mean(usage['calls'] for usage in usages),
+            statistics.mean(usage['prompt_tokens'] for usage in usages),
+            statistics.mean(usage['completion_tokens'] for usage in usages),
+            f"{statistics.mean(timings):.2f}s",
+        ])
+    print_table(['mode', 'calls', 'prompt_tokens', 'completion_tokens', 'latency'], rows)
+
+
+def run_in_child(target, args):
+    """
+    Runs target(*args, results) in a spawned process and returns what it puts on results.
+
+    Returns None, after printing the exit code, when the child dies without reporting, e.g.
+    because it raised; its traceback is on stderr.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if process.exitcode is None:
+                continue
+            # The child may have reported just before exiting
+            try:
+                result = results.get(timeout=1)
+                break
+            except queue.Empty:
+                print(f"{target.__name__} exited with code {process.exitcode} without reporting results")
+                return None
+    process.join()
+    return result
+
+
+def make_sample_deck(folder, slide_count, seconds):
+    # Renders slide images and writes a narration-length tone per slide
+    slides = [
+        {'title': f'Benchmark slide {n}', 'bullet_points': [f'Point {p} of slide {n}' for p in range(1, 6)]}
+        for n in range(1, slide_count + 1)
+    ]
+    images_folder = os.path.join(folder, 'slides_images')
+    audio_folder = os.path.join(folder, 'audio_explanations')
+    os.makedirs(audio_folder, exist_ok=True)
+    Edumorph.render_slide_images(slides, images_folder)
+    for n in range(1, slide_count + 1):
+        subprocess.run([
+            Edumorph.find_ffmpeg(), '-y', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+            '-c:a', 'libmp3lame', os.path.join(audio_folder, f'slide_{n}.mp3'),
+        ], check=True)
+    return images_folder, audio_folder
+
+
+def encode_in_child(encoder, images_folder, audio_folder, output_video, results):
+    # Runs in its own process so each encoder's peak memory is measured separately
+    Edumorph.app.config['VIDEO_ENCODER'] = encoder
+    start = time.perf_counter()
+    Edumorph.create_video(images_folder, audio_folder, output_video)
+    results.put((time.perf_counter() - start, peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN)))
+
+
+def bench_video(args):
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        images_folder, audio_folder = make_sample_deck(folder, args.slides, args.seconds)
+        for encoder in ('moviepy', 'ffmpeg'):
+            output_video = os.path.join(folder, f'{encoder}.mp4')
+            result = run_in_child(encode_in_child, (encoder, images_folder, audio_folder, output_video))
+            if result is None:
+                rows.append([encoder, 'failed', '-', '-', '-'])
+                continue
+            seconds, python_rss, subprocess_rss = result
+            rows.append([
+                encoder,
+                f"{seconds:.2f}s",
+                f"{python_rss:.0f}MB",
+                f"{subprocess_rss:.0f}MB",
+                f"{os.path.getsize(output_video) / 1024 ** 2:.1f}MB",
+            ])
+    print(f"{args.slides} slides x {args.seconds}s narration")
+    print_table(['encoder', 'encode_time', 'peak_rss', 'peak_ffmpeg_rss', 'file_size'], rows)
+
+
+PARSERS = {
+    'mcq': (llm_parsers.parse_mcq, llm_parsers.McqParser),
+    'slides': (llm_parsers.parse_slides, llm_parsers.SlideParser),
+    'subtopics': (llm_parsers.parse_subtopics, llm_parsers.SubtopicParser),
+}
+
+
+def parse_succeeded(kind, items, expected):
+    # Recorded responses carry no expected count; any usable output counts as a success for them
+    if kind == 'mcq':
+        usable = [q for q in items if len(q['options']) == 4 and q['answer'] and q['answer'][16:17] in 'ABCD' and q['answer'][17:18] == ')']
+    elif kind == 'slides':
+        usable = [slide for slide in items if slide['title'] and slide['bullet_points']]
+    else:
+        usable = items
+    return len(usable) == expected and len(items) == expected if expected is not None else bool(usable)
+
+
+def parse_streamed(parser_class, text, rng):
+    parser = parser_class()
+    items = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 16)
+        items += parser.feed(text[position:position + size])
+        position += size
+    return items + parser.close()
+
+
+def fuzz_response(response, rng):
+    # Formatting noise the model produces between runs; none of it should change what is parsed
+    lines = response.split('\n')
+    is_json = '{' in response
+    mutated = []
+    for line in lines:
+        if not is_json and line.strip() and rng.random() < 0.2:
+            line = f"**{line}**"
+        if rng.random() < 0.2:
+            line = "  " + line + " "
+        mutated.append(line)
+        if rng.random() < 0.1:
+            mutated.append("")
+    return ("\r\n" if rng.random() < 0.5 else "\n").join(mutated)
+
+
+def record_corpus(args):
+    # Appends fresh Groq responses for the real prompts, so the corpus tracks what the model currently writes
+    Edumorph.app.config['COMPLETION_CACHE_ENABLED'] = False
+    prompts = {
+        'mcq': Edumorph.mcq_prompt(args.topic, args.subtopic),
+        'slides': None,
+        'subtopics': Edumorph.subtopics_prompt(args.topic, args.level),
+    }
+    with Edumorph.app.app_context(), open(args.corpus, 'a') as corpus:
+        for _ in range(args.record):
+            for kind, prompt in prompts.items():
+                if kind == 'slides':
+                    response = "\n".join(Edumorph.create_slides(args.topic, args.subtopic))
+                else:
+                    response = Edumorph.complete(prompt, kind)
+                entry = {'kind': kind, 'note': f'recorded {args.topic} / {args.subtopic}', 'expected': 4 if kind == 'mcq' else None, 'response': response}
+                corpus.write(json.dumps(entry) + "\n")
+    print(f"Recorded {args.record * len(prompts)} responses to {args.corpus}")
+
+
+def bench_parsers(args):
+    if args.record:
+        record_corpus(args)
+    with open(args.corpus) as corpus:
+        entries = [json.loads(line) for line in corpus if line.strip()]
+    rng = random.Random(args.seed)
+
+    rows = []
+    for kind, (parse, parser_class) in PARSERS.items():
+        samples = [entry for entry in entries if entry['kind'] == kind]
+        if not samples:
+            continue
+        failures = [entry['note'] for entry in samples if not parse_succeeded(kind, parse(entry['response']), entry['expected'])]
+        fuzzed = [(fuzz_response(entry['response'], rng), entry) for entry in samples for _ in range(args.fuzz)]
+        fuzz_ok = sum(parse_succeeded(kind, parse(text), entry['expected']) for text, entry in fuzzed)
+        # Streamed parsing must agree with parsing the whole response
+        stream_ok = sum(parse_streamed(parser_class, text, rng) == parse(text) for text, _ in fuzzed if '{' not in text)
+        stream_total = sum('{' not in text for text, _ in fuzzed)
+
+        corpus_bytes = sum(len(entry['response'].encode('utf-8')) for entry in samples)
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            for entry in samples:
+                parse(entry['response'])
+        whole_rate = corpus_bytes * args.runs / (time.perf_counter() - start) / 1024 ** 2
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            for entry in samples:
+                parse_streamed(parser_class, entry['response'], rng)
+        streamed_rate = corpus_bytes * args.runs / (time.perf_counter() - start) / 1024 ** 2
+
+        rows.append([
+            kind,
+            len(samples),
+            f"{len(samples) - len(failures)}/{len(samples)}",
+            f"{fuzz_ok}/{len(fuzzed)}",
+            f"{stream_ok}/{stream_total}",
+            f"{whole_rate:.1f}MB/s",
+            f"{streamed_rate:.1f}MB/s",
+        ])
+        for note in failures:
+            print(f"{kind}: failed to parse corpus entry '{note}'")
+    print_table(['kind', 'responses', 'parsed', 'fuzzed_parsed', 'stream_matches', 'whole_rate', 'streamed_rate'], rows)
+
+
+def bench_tts(args):
+    # Narrates a deck of canned explanations whole, then chunked with a cold and a warm speech cache
+    Edumorph.app.config['TTS_BACKEND'] = args.backend
+    canned = Edumorph.CannedLLMBackend()
+    texts = [" ".join([canned.respond(f'Slide {n}', Edumorph.LLM_MODEL, {}, 'narration')] * args.repeat) for n in range(args.slides)]
+    print(f"{args.slides} narrations of ~{statistics.mean(len(text) for text in texts):.0f} characters, backend {args.backend}")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        Edumorph.app.config['SLIDE_CACHE_DIR'] = os.path.join(folder, 'cache')
+        modes = [
+            ('whole', False, 10 ** 9),
+            ('chunked', False, args.chunk_chars),
+            ('chunked_cold_cache', True, args.chunk_chars),
+            ('chunked_warm_cache', True, args.chunk_chars),
+        ]
+        for name, cached, chunk_chars in modes:
+            Edumorph.app.config.update(SLIDE_CACHE_ENABLED=cached, TTS_CHUNK_CHARS=chunk_chars)
+            paths = [os.path.join(folder, f'{name}_{n}.mp3') for n in range(args.slides)]
+            start = time.perf_counter()
+            futures = [
+                Edumorph.narration_executor.submit(Edumorph.synthesize_speech, text, 'en', path, f"Speech for slide {n + 1}")
+                for n, (text, path) in enumerate(zip(texts, paths))
+            ]
+            for future in futures:
+                future.result()
+            digest = hashlib.sha256()
+            for path in paths:
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+            rows.append([name, f"{time.perf_counter() - start:.2f}s", digest.hexdigest()[:12]])
+    print_table(['mode', 'time', 'audio_sha256'], rows)
+
+
+def legacy_tts(text):
+    # The replace() chain narrate_slide used before sanitize.py
+    for character in ['*', '"', "/", "\\", "'", "]", "[", "(", ")", "}", "{", "!", "$", "`", ":", ";", "~"]:
+        text = text.replace(character, "")
+    return text
+
+
+LEGACY_PDF_TABLE = str.maketrans(sanitize.PDF_PUNCTUATION)
+
+SANITIZE_BASELINES = {
+    'markdown': lambda text: text.replace('*', ''),
+    'tts': legacy_tts,
+    'pdf': lambda text: text.replace('*', '').translate(LEGACY_PDF_TABLE).encode('latin-1', 'replace').decode('latin-1'),
+    'html': lambda text: html.escape(text.replace('*', '')),
+}
+
+
+def bench_sanitize(args):
+    # Corpus responses plus canned narrations and PDF text, with some non-latin-1 characters mixed in
+    with open(args.corpus) as corpus:
+        texts = [json.loads(line)['response'] for line in corpus if line.strip()]
+    canned = Edumorph.CannedLLMBackend()
+    texts += [canned.respond(f'Slide {n}', Edumorph.LLM_MODEL, {}, content_type) for n in range(20) for content_type in ('narration', 'pdf')]
+    texts = [text + " \u201cquoted\u201d \u2014 caf\u00e9 \u2713 <b>&</b>" for text in texts]
+    corpus_bytes = sum(len(text.encode('utf-8')) for text in texts)
+    rng = random.Random(args.seed)
+
+    def rate(clean, profile=None):
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            for text in texts:
+                clean(text, profile) if profile else clean(text)
+        return corpus_bytes * args.runs / (time.perf_counter() - start) / 1024 ** 2
+
+    rows = []
+    for profile, baseline in SANITIZE_BASELINES.items():
+        matches = sum(sanitize.sanitize(text, profile) == baseline(text) for text in texts)
+        streamed = 0
+        for text in texts:
+            cuts = sorted(rng.sample(range(1, len(text)), min(10, len(text) - 1)))
+            chunks = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+            streamed += "".join(sanitize.sanitize_stream(chunks, profile)) == sanitize.sanitize(text, profile)
+        baseline_rate = rate(baseline)
+        sanitize_rate = rate(sanitize.sanitize, profile)
+        rows.append([
+            profile,
+            f"{matches}/{len(texts)}",
+            f"{streamed}/{len(texts)}",
+            f"{baseline_rate:.1f}MB/s",
+            f"{sanitize_rate:.1f}MB/s",
+            f"{sanitize_rate / baseline_rate:.1f}x",
+        ])
+    print(f"{len(texts)} texts, {corpus_bytes / 1024:.0f}KB")
+    print_table(['profile', 'same_output', 'stream_matches', 'replace_chain', 'sanitize', 'speedup'], rows)
+
+
+HEAVY_MODULES = ['moviepy', 'imageio', 'numpy', 'PIL', 'pptx', 'fpdf', 'gtts', 'pdf2image']
+
+# Runs in a fresh interpreter; prints import seconds, peak RSS in MB and the heavy modules that got loaded
+STARTUP_PROBE = '''
+import resource, sys, time
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+print(seconds, rss, ','.join(sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r}))))
+'''
+
+
+def import_times(stderr, top):
+    # Direct imports of the probed module, by cumulative microseconds, from -X importtime output
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and name.startswith('   ') and not name.startswith('     '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def bench_startup(args):
+    # What a fresh worker pays to import the app, with the media stack left lazy and loaded up front
+    variants = {
+        args.module: f"import {args.module}",
+        f"{args.module} + media stack": f"import {args.module}\nimport moviepy.editor, pdf2image, pptx, fpdf, gtts, PIL.Image",
+    }
+    rows = []
+    for name, imports in variants.items():
+        probe = STARTUP_PROBE.format(imports=imports, heavy=HEAVY_MODULES)
+        samples = []
+        for _ in range(args.runs):
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], capture_output=True, text=True, check=True)
+            seconds, rss, heavy = (result.stdout.strip().splitlines()[-1].split(' ') + [''])[:3]
+            samples.append((float(seconds), float(rss), heavy))
+        if name == args.module:
+            slowest = import_times(result.stderr, args.top)
+        rows.append([
+            name,
+            f"{statistics.median(seconds for seconds, _, _ in samples):.2f}s",
+            f"{statistics.median(rss for _, rss, _ in samples):.0f}MB",
+            samples[-1][2] or 'none',
+        ])
+    print_table(['import', 'time', 'peak_rss', 'heavy_modules_loaded'], rows)
+    print()
+    print(f"Slowest imports of {args.module}:")
+    print_table(['module', 'cumulative'], [[module, f"{micros / 1000:.0f}ms"] for micros, module in slowest])
+
+
+def in_memory_pdf_to_images(pdf_path, images_folder):
+    # What convert_pptx_to_images did before pdf_to_slide_images: every page decoded into memory at once
+    from pdf2image import convert_from_path
+    images = convert_from_path(pdf_path, dpi=Edumorph.app.config['PDF_IMAGE_DPI'])
+    for i, image in enumerate(images, start=1):
+        image.save(os.path.join(images_folder, f"slide_{i}.png"), "PNG")
+
+
+def measure_in_child(fn, call_args, config, results):
+    # Runs fn in a fresh process so its peak memory is not hidden by an earlier, larger run
+    Edumorph.app.config.update(config)
+    start = time.perf_counter()
+    fn(*call_args)
+    results.put((time.perf_counter() - start, peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN)))
+
+
+def bench_memory(args):
+    # Peak RSS of video assembly and PDF page extraction as the deck grows
+    rows = []
+    for slide_count in args.slides:
+        with tempfile.TemporaryDirectory() as folder:
+            images_folder, audio_folder = make_sample_deck(folder, slide_count, args.seconds)
+            cases = [
+                ('moviepy_in_memory', Edumorph.create_video, {'VIDEO_ENCODER': 'moviepy', 'VIDEO_STREAMING': False}),
+                ('moviepy_streaming', Edumorph.create_video, {'VIDEO_ENCODER': 'moviepy', 'VIDEO_STREAMING': True}),
+                ('ffmpeg_segments', Edumorph.create_video, {'VIDEO_ENCODER': 'ffmpeg'}),
+            ]
+            call_args = {name: (images_folder, audio_folder, os.path.join(folder, f'{name}.mp4')) for name, _, _ in cases}
+            if shutil.which('pdftoppm'):
+                # One PDF page per slide image, like the LibreOffice renderer's intermediate PDF
+                from PIL import Image
+                pdf_path = os.path.join(folder, 'deck.pdf')
+                pages = [Image.open(os.path.join(images_folder, f'slide_{n}.png')).convert('RGB') for n in range(1, slide_count + 1)]
+                pages[0].save(pdf_path, save_all=True, append_images=pages[1:], resolution=96)
+                for name, fn in (('pdf2image_in_memory', in_memory_pdf_to_images), ('pdf2image_paths', Edumorph.pdf_to_slide_images)):
+                    output_folder = os.path.join(folder, name)
+                    os.makedirs(output_folder)
+                    cases.append((name, fn, {'PDF_IMAGE_DPI': args.dpi}))
+                    call_args[name] = (pdf_path, output_folder)
+            for name, fn, config in cases:
+                if args.modes and name not in args.modes:
+                    continue
+                result = run_in_child(measure_in_child, (fn, call_args[name], config))
+                if result is None:
+                    rows.append([name, slide_count, 'failed', '-', '-'])
+                    continue
+                seconds, python_rss, subprocess_rss = result
+                rows.append([name, slide_count, f"{seconds:.2f}s", f"{python_rss:.0f}MB", f"{subprocess_rss:.0f}MB"])
+    if not shutil.which('pdftoppm'):
+        print("pdftoppm not found, skipping the pdf2image cases")
+    print(f"{args.seconds}s narration per slide, PDF pages at {args.dpi} dpi")
+    print_table(['mode', 'slides', 'time', 'peak_rss', 'peak_subprocess_rss'], rows)
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completions like Groq, within requests and tokens per minute budgets.
+
+    Over budget, it returns 429 with the Retry-After Groq would send. Every request takes
+    server.latency seconds, and is charged its prompt and completion tokens on arrival. The
+    next server.failures requests get a 503, as from a Groq outage.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][-1]['content']
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = self.server.completion_tokens
+        with self.server.lock:
+            failing = self.server.failures > 0
+            self.server.failures -= failing
+        if failing:
+            self.server.counts['failed'] += 1
+            self.reply(503, {'error': {'message': "Service unavailable", 'type': 'internal_server_error'}})
+            return
+        with self.server.lock:
+            now = time.monotonic()
+            self.server.requests.refill(now)
+            self.server.tokens.refill(now)
+            wait = max(self.server.requests.wait_time(1, 0), self.server.tokens.wait_time(prompt_tokens + completion_tokens, 0))
+            if wait == 0:
+                self.server.requests.level -= 1
+                self.server.tokens.level -= prompt_tokens + completion_tokens
+                self.server.counts['served'] += 1
+            else:
+                self.server.counts['rate_limited'] += 1
+        if wait > 0:
+            self.reply(429, {'error': {'message': "Rate limit reached", 'type': 'tokens', 'code': 'rate_limit_exceeded'}},
+                       {'retry-after': f"{wait:.2f}"})
+            return
+        time.sleep(self.server.latency)
+        self.reply(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex}", 'object': 'chat.completion', 'created': int(time.time()), 'model': body['model'],
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': f"Answer to: {prompt[:40]}"}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    def reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_groq(args):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockGroqHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = llm_scheduler.TokenBucket(args.rpm)
+    server.tokens = llm_scheduler.TokenBucket(args.tpm)
+    server.counts = collections.Counter()
+    server.failures = 0
+    server.latency = args.latency
+    server.completion_tokens = args.completion_tokens
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_scheduler(args):
+    # A bulk background job and a trickle of interactive requests share one rate-limited mock Groq
+    rows = []
+    modes = [
+        # Before the scheduler the Groq SDK retried 429s itself, twice by default
+        ('sdk_retries', False, 2),
+        ('scheduler', True, 0),
+    ]
+    for name, scheduled, sdk_retries in modes:
+        server = start_mock_groq(args)
+        Edumorph.groq = Edumorph.Groq(
+            api_key='benchmark', base_url=f"http://127.0.0.1:{server.server_port}", max_retries=sdk_retries,
+        )
+        Edumorph.llm_schedulers.clear()
+        Edumorph.app.config.update(
+            LLM_BACKEND='groq', COMPLETION_CACHE_ENABLED=False, LLM_SCHEDULER_ENABLED=scheduled, STRUCTURED_LOGS=False,
+            LLM_REQUESTS_PER_MINUTE=args.rpm, LLM_TOKENS_PER_MINUTE=args.tpm,
+            LLM_COMPLETION_TOKENS_ESTIMATE=args.completion_tokens,
+        )
+        latencies = {'interactive': [], 'background': []}
+        failures = collections.Counter()
+
+        def call(priority, prompt, content_type):
+            start = time.perf_counter()
+            try:
+                if priority == 'background':
+                    with Edumorph.llm_priority('background'):
+                        Edumorph.complete(prompt, content_type)
+                else:
+                    Edumorph.complete(prompt, content_type)
+            except Exception:
+                failures[priority] += 1
+                return
+            latencies[priority].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.background + args.interactive) as pool:
+            futures = [
+                pool.submit(call, 'background', f"Create slides for benchmark subtopic {n}", 'slides')
+                for n in range(args.background)
+            ]
+            # Page loads arrive while the bulk job runs, several users asking for the same few topics
+            for n in range(args.interactive):
+                time.sleep(args.interactive_interval)
+                futures.append(pool.submit(call, 'interactive', f"List subtopics of benchmark topic {n % args.distinct}", 'subtopics'))
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+
+        scheduler = Edumorph.llm_schedulers.get('scheduler')
+        coalesced = scheduler.stats['coalesced'] if scheduler else 0
+        for priority in ('interactive', 'background'):
+            values = latencies[priority]
+            rows.append([
+                name, priority, len(values), failures[priority],
+                f"{percentile(values, 0.5):.2f}s" if values else '-', f"{percentile(values, 0.99):.2f}s" if values else '-',
+                server.counts['rate_limited'] if priority == 'interactive' else '',
+                server.counts['served'] if priority == 'interactive' else '',
+                coalesced if priority == 'interactive' else '',
+                f"{elapsed:.1f}s" if priority == 'interactive' else '',
+            ])
+    print(f"Mock Groq at {args.rpm} requests and {args.tpm} tokens per minute, {args.latency}s per completion")
+    print_table(['mode', 'priority', 'completed', 'failed', 'p50', 'p99', 'server_429s', 'upstream_calls', 'coalesced', 'wall'], rows)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def configure_offline(folder, llm_latency, caches):
+    # Canned completions, silent narration and a fresh database, with every file under folder
+    Edumorph.app.config.update(
+        LLM_BACKEND='canned',
+        LLM_CANNED_LATENCY=llm_latency,
+        TTS_BACKEND='silent',
+        COMPLETION_CACHE_ENABLED=caches,
+        SLIDE_CACHE_ENABLED=caches,
+        ARTIFACTS_DIR=os.path.join(folder, 'artifacts'),
+        SLIDE_CACHE_DIR=os.path.join(folder, 'slide_cache'),
+        SCRATCH_ROOT=folder,
+        PRECOMPUTE_SCHEDULER_ENABLED=False,
+        LLM_SCHEDULER_ENABLED=False,
+    )
+    with Edumorph.app.app_context():
+        Edumorph.db.drop_all()
+        Edumorph.db.create_all()
+        password = Edumorph.bcrypt.generate_password_hash('benchmark').decode('utf-8')
+        Edumorph.db.session.add(Edumorph.User(username='benchmark', password=password))
+        Edumorph.db.session.commit()
+
+
+def logged_in_client():
+    client = Edumorph.app.test_client()
+    client.post('/login', data={'username': 'benchmark', 'password': 'benchmark'})
+    return client
+
+
+def generate_slides_flow(tag):
+    # Logs in, requests a video and polls the job like play_video.html does, all through the WSGI app
+    client = logged_in_client()
+    response = client.get(f'/generate_slides/Python/Benchmark {tag}/Beginner')
+    job_id = urllib.parse.parse_qs(urllib.parse.urlparse(response.location).query)['job_id'][0]
+    while True:
+        status = client.get(f'/video_job/{job_id}').get_json()
+        if status['status'] == 'done':
+            return
+        if status['status'] == 'failed':
+            raise RuntimeError(status['error'])
+        time.sleep(0.05)
+
+
+def prepare_offline_op(op, folder, args):
+    # Returns a function running the op once; iteration numbers keep prompts, and so cache keys, distinct
+    tag = uuid.uuid4().hex[:8]
+    with Edumorph.app.app_context():
+        slides_text = "\n".join(Edumorph.create_slides('Python', 'Loops')) + "\n"
+        mcq_response = Edumorph.complete(Edumorph.mcq_prompt('Python', 'Loops'), 'mcq')
+    slides = Edumorph.summarize_content(slides_text)
+
+    if op == 'get_subtopics':
+        return lambda i: Edumorph.get_subtopics(f'Python {tag} {i}', 'Beginner')
+    if op == 'summarize_content':
+        return lambda i: Edumorph.summarize_content(slides_text)
+    if op == 'create_ppt':
+        return lambda i: Edumorph.create_ppt(slides, os.path.join(folder, f'deck_{i}.pptx'))
+    if op == 'parse_mcq_response':
+        return lambda i: Edumorph.parse_mcq_response(mcq_response)
+    if op == 'generate_pdf':
+        return lambda i: Edumorph.generate_pdf(f'Loops {tag} {i}', 'Python', 'Beginner')
+    if op == 'create_video':
+        images_folder, audio_folder = make_sample_deck(folder, args.slides, args.seconds)
+        return lambda i: Edumorph.create_video(images_folder, audio_folder, os.path.join(folder, f'video_{i}.mp4'))
+    if op == 'generate_slides':
+        return lambda i: generate_slides_flow(f'{tag} {i}')
+    if op == 'dashboard':
+        # An authenticated page view; sessions are logged in up front so bcrypt is not timed
+        clients = queue.Queue()
+        for _ in range(args.concurrency):
+            clients.put(logged_in_client())
+
+        def view(i):
+            client = clients.get()
+            try:
+                if client.get('/dashboard').status_code != 200:
+                    raise RuntimeError("dashboard did not render")
+            finally:
+                clients.put(client)
+        return view
+    raise ValueError(f"Unknown op {op}")
+
+
+def run_offline_op(op, args, results):
+    # Runs in its own process so peak RSS belongs to this op alone
+    with tempfile.TemporaryDirectory() as folder:
+        configure_offline(folder, args.llm_latency, args.caches)
+        run_once = prepare_offline_op(op, folder, args)
+
+        def timed(i):
+            start = time.perf_counter()
+            with Edumorph.app.app_context():
+                try:
+                    run_once(i)
+                except Exception as e:
+                    print(f"{op} run {i} failed: {e}")
+                    return None
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            latencies = list(executor.map(timed, range(args.runs)))
+        wall = time.perf_counter() - start
+    if Edumorph.slide_render_executor is not None:
+        # The render pool is only shut down at interpreter exit, which a multiprocessing child never reaches
+        Edumorph.slide_render_executor.shutdown()
+    results.put((latencies, wall, peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN)))
+
+
+def bench_offline(args):
+    rows = []
+    for op in args.ops:
+        result = run_in_child(run_offline_op, (op, args))
+        if result is None:
+            rows.append([op, 'failed', '-', '-', '-', '-', '-'])
+            continue
+        latencies, wall, python_rss, subprocess_rss = result
+        succeeded = [latency for latency in latencies if latency is not None]
+        rows.append([
+            op,
+            f"{len(succeeded)}/{len(latencies)}",
+            f"{len(succeeded) / wall:.2f}/s",
+            f"{percentile(succeeded, 0.50) * 1000:.1f}ms" if succeeded else '-',
+            f"{percentile(succeeded, 0.99) * 1000:.1f}ms" if succeeded else '-',
+            f"{python_rss:.0f}MB",
+            f"{subprocess_rss:.0f}MB",
+        ])
+    print(f"{args.runs} runs per op, concurrency {args.concurrency}, canned LLM latency {args.llm_latency}s, "
+          f"caches {'on' if args.caches else 'off'}")
+    print_table(['op', 'ok', 'throughput', 'p50', 'p99', 'peak_rss', 'peak_child_rss'], rows)
+
+
+OFFLINE_OPS = [
+    'get_subtopics', 'summarize_content', 'create_ppt', 'parse_mcq_response', 'generate_pdf', 'create_video',
+    'generate_slides', 'dashboard',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Edumorph pipeline stages")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    narration = subparsers.add_parser('narration', help="per-slide vs batched narration requests")
+    narration.add_argument('--topic', default='Python')
+    narration.add_argument('--subtopic', default='Loops')
+    narration.add_argument('--runs', type=int, default=3)
+    narration.set_defaults(func=bench_narration)
+
+    video = subparsers.add_parser('video', help="moviepy vs still-image ffmpeg encoding")
+    video.add_argument('--slides', type=int, default=10)
+    video.add_argument('--seconds', type=float, default=6)
+    video.set_defaults(func=bench_video)
+
+    parsers = subparsers.add_parser('parsers', help="LLM output parser success rate and throughput over a response corpus")
+    parsers.add_argument('--corpus', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.jsonl'))
+    parsers.add_argument('--fuzz', type=int, default=50, help="Formatting-noise variants per corpus response")
+    parsers.add_argument('--runs', type=int, default=200, help="Passes over the corpus for the throughput figures")
+    parsers.add_argument('--seed', type=int, default=0)
+    parsers.add_argument('--record', type=int, default=0, help="First append this many live responses per kind to the corpus")
+    parsers.add_argument('--topic', default='Python')
+    parsers.add_argument('--subtopic', default='Loops')
+    parsers.add_argument('--level', default='Beginner')
+    parsers.set_defaults(func=bench_parsers)
+
+    offline = subparsers.add_parser('offline', help="hot paths under concurrency with canned LLM and silent TTS backends")
+    offline.add_argument('--ops', nargs='+', choices=OFFLINE_OPS, default=OFFLINE_OPS)
+    offline.add_argument('--runs', type=int, default=20, help="Calls per op")
+    offline.add_argument('--concurrency', type=int, default=4, help="Threads calling each op at once")
+    offline.add_argument('--llm-latency', type=float, default=0.0, help="Seconds each canned completion takes")
+    offline.add_argument('--caches', action='store_true', help="Keep the completion and slide caches on")
+    offline.add_argument('--slides', type=int, default=8, help="Slides in the create_video deck")
+    offline.add_argument('--seconds', type=float, default=4, help="Narration length per create_video slide")
+    offline.set_defaults(func=bench_offline)
+
+    tts = subparsers.add_parser('tts', help="whole vs chunked speech synthesis, with and without the speech cache")
+    tts.add_argument('--backend', default='gtts', choices=sorted(Edumorph.TTS_BACKENDS))
+    tts.add_argument('--slides', type=int, default=10)
+    tts.add_argument('--repeat', type=int, default=2, help="Copies of the canned explanation per narration")
+    tts.add_argument('--chunk-chars', type=int, default=300)
+    tts.set_defaults(func=bench_tts)
+
+    sanitizer = subparsers.add_parser('sanitize', help="sanitize.py profiles vs the replace() chains they replaced")
+    sanitizer.add_argument('--corpus', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.jsonl'))
+    sanitizer.add_argument('--runs', type=int, default=200)
+    sanitizer.add_argument('--seed', type=int, default=0)
+    sanitizer.set_defaults(func=bench_sanitize)
+
+    startup = subparsers.add_parser('startup', help="import time and RSS of a fresh worker, and which heavy modules it loads")
+    startup.add_argument('--module', default='Edumorph')
+    startup.add_argument('--runs', type=int, default=5)
+    startup.add_argument('--top', type=int, default=10, help="Slowest direct imports to list")
+    startup.set_defaults(func=bench_startup)
+
+    memory = subparsers.add_parser('memory', help="peak RSS of in-memory vs streaming video assembly and PDF page extraction")
+    memory.add_argument('--slides', type=int, nargs='+', default=[10, 40], help="Deck sizes to measure")
+    memory.add_argument('--seconds', type=float, default=3, help="Narration length per slide")
+    memory.add_argument('--dpi', type=int, default=200, help="PDF_IMAGE_DPI for the pdf2image cases")
+    memory.add_argument('--modes', nargs='+', help="Only run these modes")
+    memory.set_defaults(func=bench_memory)
+
+    scheduler = subparsers.add_parser('scheduler', help="LLM scheduler vs SDK retries against a rate-limited mock Groq server")
+    scheduler.add_argument('--rpm', type=int, default=300, help="Mock server requests per minute")
+    scheduler.add_argument('--tpm', type=int, default=30000, help="Mock server tokens per minute")
+    scheduler.add_argument('--latency', type=float, default=0.3, help="Seconds per mock completion")
+    scheduler.add_argument('--completion-tokens', type=int, default=400, help="Tokens in each mock completion")
+    scheduler.add_argument('--background', type=int, default=120, help="Bulk slide requests, all submitted at once")
+    scheduler.add_argument('--interactive', type=int, default=30, help="Subtopic requests arriving during the bulk job")
+    scheduler.add_argument('--interactive-interval', type=float, default=0.05, help="Seconds between interactive requests")
+    scheduler.add_argument('--distinct', type=int, default=5, help="Different prompts among the interactive requests")
+    scheduler.set_defaults(func=bench_scheduler)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
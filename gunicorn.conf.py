@@ -0,0 +1,50 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import subprocess
+import sys
+
+bind = os.environ.get('EDUMORPH_BIND', '0.0.0.0:8000')
+
+# Workers only serve requests. Video jobs and the precompute scheduler run in one
+# `flask background` process that the master starts below, and workers share video jobs
+# through the database, so any number of workers can run side by side. In-process caches
+# and /metrics are per worker. Threads carry the concurrency within a worker: page views
+# are short, but every open SSE stream and /video_live response holds a thread until it finishes.
+workers = int(os.environ.get('EDUMORPH_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('EDUMORPH_THREADS', 64))
+
+# Streams and long polls stay open for minutes; idle keep-alive connections are closed quickly
+timeout = 300
+graceful_timeout = 60
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+background = None
+
+
+def flask_command(*args):
+    return [sys.executable, '-m', 'flask', '--app', 'Edumorph', *args]
+
+
+def on_starting(server):
+    # Tables are created once, before any worker queries them
+    subprocess.run(flask_command('init-db'), cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def when_ready(server):
+    global background
+    background = subprocess.Popen(flask_command('background'), cwd=os.path.dirname(os.path.abspath(__file__)))
+    server.log.info("Started background services (pid %s)", background.pid)
+
+
+def on_exit(server):
+    # Jobs interrupted here are queued again when the background process next starts
+    if background is not None:
+        background.terminate()
+        try:
+            background.wait(graceful_timeout)
+        except subprocess.TimeoutExpired:
+            background.kill()
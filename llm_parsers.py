@@ -0,0 +1,218 @@
+"""
+Incremental parsers for the text formats the LLM is prompted to produce.
+
+Parsers are fed text as it arrives, either a whole response or streamed chunks, and return
+items as soon as they are complete. Every line is scanned once against precompiled
+patterns, so feeding a response chunk by chunk gives exactly the same items as parsing
+it in one go.
+"""
+import json
+import re
+
+from sanitize import sanitize
+
+SLIDE_HEADING = re.compile(r'slide\s+\d+\s*:\s*(.*)', re.IGNORECASE)
+QUESTION_HEADING = re.compile(
+    r'(?:question(?:\s*\d+)?|q\d+)\b\s*[:.)-]?\s*(.*)|\d+\s*[.)]\s+(.+\?)\s*$',
+    re.IGNORECASE,
+)
+OPTION = re.compile(r'\(?([A-Da-d])\s*[).:]\s*(.*)')
+ANSWER = re.compile(r'(?:correct\s+)?answer\s*(?:is\s*)?[:\-]?\s*(.*)', re.IGNORECASE)
+ANSWER_LETTER = (
+    re.compile(r'\(?\b([A-Da-d])\)'),  # "B)" anywhere, as in "Correct answer: B) for"
+    re.compile(r'^\(?([A-D])\b'),  # A leading capital letter, as in "B - for loop"
+    re.compile(r'\b(?:option|is)\s+\(?([A-Da-d])\b\)?', re.IGNORECASE),  # "option c", "the answer is b"
+)
+
+
+def clean_line(line):
+    # The model decorates lines with markdown emphasis and headings; none of it is shown
+    return sanitize(line, 'markdown').strip().lstrip('#').lstrip()
+
+
+class LineParser:
+    """Splits fed text into lines and hands each complete line to parse_line()."""
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, chunk):
+        self.pending += chunk
+        if '\n' not in chunk:
+            return []
+        *lines, self.pending = self.pending.split('\n')
+        items = []
+        for line in lines:
+            self.parse_line(clean_line(line), items)
+        return items
+
+    def close(self):
+        items = []
+        if self.pending:
+            self.parse_line(clean_line(self.pending), items)
+            self.pending = ""
+        self.finish(items)
+        return items
+
+    def parse_line(self, line, items):
+        raise NotImplementedError
+
+    def finish(self, items):
+        pass
+
+    @classmethod
+    def parse(cls, text):
+        parser = cls()
+        return parser.feed(text) + parser.close()
+
+
+class SubtopicParser(LineParser):
+    """Emits each non-empty line of a subtopic list."""
+
+    def parse_line(self, line, items):
+        if line:
+            items.append(line)
+
+
+class SlideParser(LineParser):
+    """Emits {'title', 'bullet_points'} dicts for "Slide N: title" headings and the lines below them."""
+
+    def __init__(self):
+        super().__init__()
+        self.slide = None
+
+    def parse_line(self, line, items):
+        heading = SLIDE_HEADING.match(line)
+        if heading:
+            if self.slide is not None:
+                items.append(self.slide)
+            self.slide = {'title': heading.group(1).strip(), 'bullet_points': []}
+        elif self.slide is not None:
+            bullet = line.lstrip('-•').strip()
+            if bullet:
+                self.slide['bullet_points'].append(bullet)
+
+    def finish(self, items):
+        if self.slide is not None:
+            items.append(self.slide)
+            self.slide = None
+
+
+class McqParser(LineParser):
+    """
+    Emits {'question', 'options', 'answer'} dicts from "Question N: ..." / "A) ..." /
+    "Correct answer: ..." blocks.
+
+    A heading with no text takes the next line as the question. Lines between the question
+    and its first option continue the question. Answers are normalized to
+    "Correct Answer: B) <option>" whenever the letter can be resolved. Questions without
+    options are dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.question = None
+        self.awaiting_text = False
+
+    def parse_line(self, line, items):
+        if not line:
+            return
+        if self.awaiting_text:
+            self.question['question'] = line
+            self.awaiting_text = False
+            return
+
+        answer = ANSWER.match(line)
+        if answer and self.question is not None:
+            self.question['answer'] = answer.group(1).strip()
+            return
+        option = OPTION.match(line) if self.question is not None else None
+        if option:
+            self.question['options'].append(f"{option.group(1).upper()}) {option.group(2).strip()}")
+            return
+        heading = QUESTION_HEADING.match(line)
+        if heading:
+            self.emit(items)
+            text = (heading.group(1) or heading.group(2) or "").strip()
+            self.question = {'question': text, 'options': [], 'answer': None}
+            self.awaiting_text = not text
+            return
+        if self.question is not None and not self.question['options']:
+            self.question['question'] = f"{self.question['question']} {line}".strip()
+
+    def finish(self, items):
+        self.emit(items)
+
+    def emit(self, items):
+        question, self.question, self.awaiting_text = self.question, None, False
+        if question is None or not question['question'] or not question['options']:
+            return
+        if question['answer'] is not None:
+            question['answer'] = normalize_answer(question['answer'], question['options'])
+        items.append(question)
+
+
+def normalize_answer(answer, options):
+    # Resolves the answer to one of the "X) ..." options, which is what the MCQ page checks against
+    wanted = answer.strip().rstrip('.').lower()
+    for option in options:
+        # Some answers repeat the option text instead of its letter
+        if option[3:].strip().rstrip('.').lower() == wanted:
+            return f"Correct Answer: {option}"
+    for pattern in ANSWER_LETTER:
+        letter = pattern.search(answer)
+        if letter is not None:
+            index = 'abcd'.index(letter.group(1).lower())
+            if index < len(options):
+                return f"Correct Answer: {options[index]}"
+    return f"Correct Answer: {answer}"
+
+
+def parse_json_object(text):
+    # Tolerates prose or code fences around the JSON object; returns None when there is none
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_mcq_json(text):
+    # {"questions": [{"question", "options": [4 strings], "answer"}]}; malformed entries are dropped
+    data = parse_json_object(text) or {}
+    questions = []
+    for entry in data.get('questions', []):
+        if not isinstance(entry, dict):
+            continue
+        question, options, answer = entry.get('question'), entry.get('options'), entry.get('answer')
+        if not (isinstance(question, str) and question.strip() and isinstance(answer, str)):
+            continue
+        if not (isinstance(options, list) and len(options) == 4 and all(isinstance(o, str) for o in options)):
+            continue
+        labelled = [OPTION.match(option.strip()) for option in options]
+        options = [
+            f"{letter}) {(match.group(2) if match else option).strip()}"
+            for letter, option, match in zip('ABCD', options, labelled)
+        ]
+        questions.append({'question': question.strip(), 'options': options, 'answer': normalize_answer(answer, options)})
+    return questions
+
+
+def parse_mcq(text):
+    # JSON-mode responses are tried first, anything else goes through the line format parser
+    if '{' in text:
+        questions = parse_mcq_json(text)
+        if questions:
+            return questions
+    return McqParser.parse(text)
+
+
+def parse_slides(text):
+    return SlideParser.parse(text)
+
+
+def parse_subtopics(text):
+    return SubtopicParser.parse(text)
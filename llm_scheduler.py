@@ -0,0 +1,206 @@
+"""
+Admission control for LLM requests: rate budgets, priority classes, coalescing and retries.
+
+Every upstream call asks the scheduler for a slot first. A slot takes one request and the
+call's estimated tokens from two token buckets that refill continuously at the per-minute
+limits, plus one of max_concurrent connections. Waiting callers are admitted strictly by
+priority class, then in arrival order, and the lower classes must leave a reserve in each
+bucket, so bulk work cannot spend the budget an interactive page load is about to need.
+
+A 429 from upstream pauses all admissions for the server's Retry-After (or an exponential
+backoff) plus jitter, so waiting callers do not all retry at the same moment. Other errors
+the retryable predicate accepts, such as server errors and dropped connections, are retried
+by the failed caller alone after its own backoff.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+PRIORITIES = {'interactive': 0, 'default': 1, 'background': 2}
+
+
+class TokenBucket:
+    """Holds up to one minute of budget and refills continuously at per_minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, floor):
+        # Seconds until amount can be taken while leaving floor in the bucket
+        return max(0.0, (amount + floor - self.level) / self.rate)
+
+
+def is_rate_limited(error):
+    return getattr(error, 'status_code', None) == 429
+
+
+def usage_tokens(usage):
+    if usage is None:
+        return None
+    return (getattr(usage, 'prompt_tokens', None) or 0) + (getattr(usage, 'completion_tokens', None) or 0)
+
+
+class LLMScheduler:
+    """
+    Rate-limited, prioritized gate in front of an LLM API.
+
+    call() runs one request; stream() wraps a streaming request. coalesce() lets callers
+    with the same key share one in-flight result. retryable(error) decides which errors are
+    retried, 429s only by default. retry_delay(error, default) returns the seconds to wait
+    after a 429, typically from its Retry-After header. on_admit(priority, seconds) is called
+    with the time each request spent waiting for its slot.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrent, reserve=0.2, retries=4,
+                 backoff=1.0, retryable=None, retry_delay=lambda error, default: default, on_admit=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrent = max_concurrent
+        self.reserve = reserve
+        self.retries = retries
+        self.backoff = backoff
+        self.retryable = retryable or is_rate_limited
+        self.retry_delay = retry_delay
+        self.on_admit = on_admit
+        self.condition = threading.Condition()
+        self.waiting = []  # Heap of (priority rank, arrival number)
+        self.arrivals = itertools.count()
+        self.running = 0
+        self.paused_until = 0.0
+        self.inflight = {}  # coalesce key -> Future
+        self.inflight_lock = threading.Lock()
+        self.stats = Counter()
+
+    def acquire(self, priority, tokens):
+        # Blocks until this request may go upstream
+        start = time.monotonic()
+        ticket = (PRIORITIES[priority], next(self.arrivals))
+        tokens = min(tokens, self.tokens.capacity)
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                delay = self.admission_delay(ticket, tokens)
+                if delay == 0:
+                    break
+                self.condition.wait(delay)
+            heapq.heappop(self.waiting)
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            self.running += 1
+            # The next caller in line may be admissible too
+            self.condition.notify_all()
+        if self.on_admit is not None:
+            self.on_admit(priority, time.monotonic() - start)
+
+    def admission_delay(self, ticket, tokens):
+        # 0 to go now, seconds until the budget allows it, or None to wait for a release
+        if self.waiting[0] != ticket or self.running >= self.max_concurrent:
+            return None
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        share = self.reserve if ticket[0] > 0 else 0.0
+        return max(
+            self.requests.wait_time(1, self.floor(self.requests, share, 1)),
+            self.tokens.wait_time(tokens, self.floor(self.tokens, share, tokens)),
+        )
+
+    def floor(self, bucket, share, amount):
+        # The reserve a lower class must leave, shrunk so that amount always fits in a full bucket;
+        # otherwise a large request would never be admitted and would block its class forever
+        return max(0.0, min(share * bucket.capacity, bucket.capacity - amount))
+
+    def release(self, estimated_tokens, actual_tokens=None):
+        with self.condition:
+            self.running -= 1
+            if actual_tokens is not None:
+                # Settle the estimate against what the call really used
+                self.tokens.refill(time.monotonic())
+                self.tokens.level -= actual_tokens - min(estimated_tokens, self.tokens.capacity)
+            self.condition.notify_all()
+
+    def backoff_delay(self, error, attempt):
+        # Seconds the failed caller sleeps before its next attempt, once its slot is released
+        base = self.backoff * 2 ** (attempt - 1)
+        if not is_rate_limited(error):
+            self.stats['retried_error'] += 1
+            return base + random.uniform(0, base)
+        # A 429 pauses everyone instead; full jitter on top of the server's delay spreads
+        # the retries of everyone who was paused
+        delay = self.retry_delay(error, base) + random.uniform(0, base)
+        self.stats['rate_limited'] += 1
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.condition.notify_all()
+        return 0
+
+    def call(self, fn, priority, tokens):
+        # fn() returns (result, usage); retryable errors are retried up to self.retries times
+        for attempt in itertools.count(1):
+            self.acquire(priority, tokens)
+            actual = None
+            try:
+                result, usage = fn()
+                actual = usage_tokens(usage)
+                return result, usage
+            except Exception as e:
+                if not self.retryable(e) or attempt > self.retries:
+                    raise
+                delay = self.backoff_delay(e, attempt)
+            finally:
+                self.release(tokens, actual)
+            time.sleep(delay)
+
+    def stream(self, open_stream, priority, tokens):
+        # Yields the (text, usage) pairs of open_stream(); retryable errors before the first chunk are retried
+        for attempt in itertools.count(1):
+            self.acquire(priority, tokens)
+            actual = None
+            started = False
+            try:
+                for text, usage in open_stream():
+                    started = True
+                    actual = usage_tokens(usage) or actual
+                    yield text, usage
+                return
+            except Exception as e:
+                if started or not self.retryable(e) or attempt > self.retries:
+                    raise
+                delay = self.backoff_delay(e, attempt)
+            finally:
+                self.release(tokens, actual)
+            time.sleep(delay)
+
+    def coalesce(self, key, fn):
+        # Runs fn() once for concurrent callers with the same key; returns (result, shared)
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+        if not leader:
+            self.stats['coalesced'] += 1
+            return future.result(), True
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                del self.inflight[key]
@@ -0,0 +1,174 @@
+"""
+Tests for llm_scheduler.py against the rate-limited mock Groq server from benchmark.py.
+
+Run with: python -m pytest test_llm_scheduler.py
+"""
+import argparse
+import threading
+import time
+
+import pytest
+
+import benchmark
+import llm_scheduler
+from benchmark import Edumorph
+
+
+@pytest.fixture
+def mock_groq():
+    # Points Edumorph's Groq client at a fresh mock server; yields (server, configure)
+    servers = []
+    saved_groq, saved_config = Edumorph.groq, dict(Edumorph.app.config)
+
+    def configure(rpm=600, tpm=60000, latency=0.0, completion_tokens=100, **config):
+        server = benchmark.start_mock_groq(argparse.Namespace(rpm=rpm, tpm=tpm, latency=latency, completion_tokens=completion_tokens))
+        servers.append(server)
+        Edumorph.groq = Edumorph.Groq(api_key='test', base_url=f"http://127.0.0.1:{server.server_port}", max_retries=0)
+        Edumorph.llm_schedulers.clear()
+        Edumorph.app.config.update(
+            LLM_BACKEND='groq', COMPLETION_CACHE_ENABLED=False, LLM_SCHEDULER_ENABLED=True, STRUCTURED_LOGS=False,
+            # A little under the server's limits, which also refill while admitted requests are in flight
+            LLM_REQUESTS_PER_MINUTE=int(rpm * 0.95), LLM_TOKENS_PER_MINUTE=int(tpm * 0.95), LLM_COMPLETION_TOKENS_ESTIMATE=completion_tokens,
+            LLM_RATE_LIMIT_BACKOFF=0.05,
+        )
+        Edumorph.app.config.update(config)
+        return server
+
+    yield configure
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    Edumorph.groq = saved_groq
+    Edumorph.app.config.update(saved_config)
+    Edumorph.llm_schedulers.clear()
+
+
+def run_concurrently(fn, args_list):
+    results = [None] * len(args_list)
+
+    def run(index, args):
+        results[index] = fn(*args)
+
+    threads = [threading.Thread(target=run, args=(index, args)) for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return results
+
+
+@pytest.mark.parametrize('scheduled', [True, False])
+def test_complete_returns_text_with_cache_disabled(mock_groq, scheduled):
+    mock_groq(LLM_SCHEDULER_ENABLED=scheduled)
+    assert Edumorph.complete("List subtopics of Python", 'subtopics') == "Answer to: List subtopics of Python"
+
+
+def test_no_rate_limits_within_budget(mock_groq):
+    # 24 calls need more token budget than one minute's burst holds, so some have to wait for it
+    server = mock_groq(tpm=12000, completion_tokens=500)
+    prompts = [(f"List subtopics of topic {n}", 'subtopics') for n in range(24)]
+    results = run_concurrently(Edumorph.complete, prompts)
+    assert results == [f"Answer to: {prompt}" for prompt, _ in prompts]
+    assert server.counts['rate_limited'] == 0
+    assert server.counts['served'] == 24
+
+
+def test_interactive_admitted_before_queued_background():
+    scheduler = llm_scheduler.LLMScheduler(6000, 10 ** 6, max_concurrent=1)
+    holding, admitted = threading.Event(), []
+
+    def hold():
+        holding.wait(10)
+        return None, None
+
+    def record(name):
+        admitted.append(name)
+        return None, None
+
+    blocker = threading.Thread(target=scheduler.call, args=(hold, 'background', 10))
+    blocker.start()
+    waiters = []
+    for name, priority in [('background 1', 'background'), ('background 2', 'background'), ('interactive', 'interactive')]:
+        waiter = threading.Thread(target=scheduler.call, args=(lambda name=name: record(name), priority, 10))
+        waiter.start()
+        waiters.append(waiter)
+        # Queue them in this order behind the blocker
+        deadline = time.monotonic() + 5
+        while len(scheduler.waiting) < len(waiters) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    holding.set()
+    for thread in [blocker, *waiters]:
+        thread.join(timeout=10)
+    assert admitted == ['interactive', 'background 1', 'background 2']
+
+
+def test_concurrent_identical_prompts_share_one_call(mock_groq):
+    server = mock_groq(latency=0.3)
+    results = run_concurrently(Edumorph.complete, [("List subtopics of Python", 'subtopics')] * 8)
+    assert results == ["Answer to: List subtopics of Python"] * 8
+    assert server.counts['served'] == 1
+    assert Edumorph.llm_schedulers['scheduler'].stats['coalesced'] == 7
+
+
+def test_rate_limited_call_is_retried_after_retry_after(mock_groq):
+    server = mock_groq(rpm=600)
+    # Drain the mock's request budget so the first attempt gets a 429 with a 0.1s Retry-After
+    with server.lock:
+        server.requests.level, server.requests.updated = 0, time.monotonic()
+    start = time.monotonic()
+    assert Edumorph.complete("List subtopics of Python", 'subtopics') == "Answer to: List subtopics of Python"
+    assert time.monotonic() - start >= 0.1
+    assert server.counts['rate_limited'] == 1
+    assert server.counts['served'] == 1
+    assert Edumorph.llm_schedulers['scheduler'].stats['rate_limited'] == 1
+
+
+def test_server_errors_are_retried(mock_groq):
+    server = mock_groq()
+    server.failures = 2
+    assert Edumorph.complete("List subtopics of Python", 'subtopics') == "Answer to: List subtopics of Python"
+    assert server.counts['failed'] == 2
+    assert Edumorph.llm_schedulers['scheduler'].stats['retried_error'] == 2
+
+
+def test_stream_retried_only_before_first_chunk():
+    scheduler = llm_scheduler.LLMScheduler(6000, 10 ** 6, 4, backoff=0.01, retryable=lambda e: isinstance(e, ConnectionError))
+    attempts = []
+
+    def open_stream(fail_after):
+        attempts.append(fail_after)
+        if len(attempts) == 1:
+            raise ConnectionError("dropped before the first chunk")
+        yield "partial", None
+        if fail_after:
+            raise ConnectionError("dropped mid-stream")
+        yield " answer", None
+
+    assert [text for text, _ in scheduler.stream(lambda: open_stream(False), 'interactive', 10)] == ["partial", " answer"]
+    assert scheduler.stats['retried_error'] == 1
+    attempts.clear()
+    with pytest.raises(ConnectionError):
+        list(scheduler.stream(lambda: open_stream(True), 'interactive', 10))
+    assert len(attempts) == 2
+
+
+@pytest.mark.parametrize('failure', ['server_error', 'rate_limit'])
+def test_sdk_retries_without_scheduler(mock_groq, failure):
+    server = mock_groq(LLM_SCHEDULER_ENABLED=False)
+    if failure == 'server_error':
+        server.failures = 1
+    else:
+        with server.lock:
+            server.requests.level, server.requests.updated = 0, time.monotonic()
+    assert Edumorph.complete("List subtopics of Python", 'subtopics') == "Answer to: List subtopics of Python"
+    assert server.counts['served'] == 1
+
+
+def test_large_background_call_is_admitted():
+    # A call bigger than the budget left outside the reserve must still go through, not block its class
+    scheduler = llm_scheduler.LLMScheduler(60, 1000, 4, reserve=0.2)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(scheduler.call(lambda: ('ok', None), 'background', 900)))
+    thread.start()
+    thread.join(timeout=5)
+    assert result == [('ok', None)]
@@ -0,0 +1,3 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# Background services run in their own process, started by the hooks in gunicorn.conf.py
+from Edumorph import app